@@ -1,19 +1,21 @@
 from dotenv import load_dotenv
 import os
+import sys
+import time
 import json
 import logging
-from typing import Any
+import functools
 from typing_extensions import TypedDict
-from livekit.rtc import participant
-from openai import OpenAI
-from openai.types.beta.realtime import session
-from pinecone import Pinecone, ServerlessSpec
 import asyncio
 from livekit import agents
 from livekit.agents import AgentSession, Agent, RoomInputOptions, ChatContext, function_tool, RunContext, get_job_context
-from livekit.plugins import deepgram, silero, aws, openai, noise_cancellation, elevenlabs, google
 # from livekit.plugins.turn_detector.english import EnglishModel  # Disabled due to timeout issues
 from prompt import SYSTEM_PROMPT
+from annindex import ANN_INDEX_DIR, CATALOG_DIR, ANNIndex, load_index
+from search_cursor import CANDIDATE_POOL_SIZE, SearchCursor, parse_bedrooms, parse_filter, parse_price
+from similarity import SimilarityGraph
+from ratelimit import INTERACTIVE, INTERACTIVE_DEADLINE, RateLimitExceeded, openai_limiter, pinecone_limiter
+from loadreport import WORKER_LOAD_THRESHOLD, admit_job, init_worker_state, job_monitor, track_tool_call, worker_load
 
 load_dotenv()
 # import env
@@ -22,23 +24,99 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 
-openai_client = OpenAI(api_key=OPENAI_KEY)
+def import_plugins():
+    # The session's provider plugins are imported here, from prewarm, instead of
+    # at module level so worker startup does not pay for them. Plugins register
+    # themselves on import, which must happen on the main thread: run() imports
+    # them up front whenever prewarm would run on a thread instead.
+    from livekit.plugins import deepgram, google, noise_cancellation, openai, silero
+
+
+# Network clients and local indexes are built on first use, not at import
+@functools.lru_cache(maxsize=None)
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_KEY)
+
+
+@functools.lru_cache(maxsize=None)
+def get_index():
+    # Prefer the local ANN index (built by annindex.py) over Pinecone when present
+    try:
+        index = load_index(ANN_INDEX_DIR)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring local ANN index, falling back to Pinecone: {e}")
+        index = None
+    if index is None:
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        index = pc.Index(PINECONE_INDEX_NAME)
+    return index
+
+
+@functools.lru_cache(maxsize=None)
+def get_similarity_graph():
+    # Listing neighbours precomputed at ingestion, for "more like this"
+    return SimilarityGraph.load(CATALOG_DIR)
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
 
 class SendItem(TypedDict):
     data: str
 
 
 def get_embedding(text: str) -> list:
-    res = openai_client.embeddings.create(
+    openai_limiter.acquire(INTERACTIVE, deadline=INTERACTIVE_DEADLINE)
+    res = get_openai_client().embeddings.create(
         input=[text],
         model="text-embedding-3-small"
     )
     return res.data[0].embedding
 
 
+def query_index(**kwargs):
+    index = get_index()
+    # The local ANN index has no remote rate limit
+    if not isinstance(index, ANNIndex):
+        pinecone_limiter.acquire(INTERACTIVE, deadline=INTERACTIVE_DEADLINE)
+    return index.query(**kwargs)
+
+
+def listing_to_match(listing: dict) -> dict:
+    return {
+        "title": listing.get("title", "Untitled"),
+        "imgs": listing.get("imgs", []),
+        "videos": listing.get("videos", ""),
+        "floor_plan": listing.get("floor_plain", []),
+        "virtual_tutor": listing.get("virtual_tutor", []),
+        "property_id": listing.get("property_detail", {}).get("PROPERTY ID", ""),
+        "price": listing.get("property_detail", {}).get("PRICE", ""),
+        "property_type": listing.get("property_detail", {}).get("PROPERTY TYPE", ""),
+        "marketed_by": listing.get("property_detail", {}).get("MARKETED BY", ""),
+        "status": listing.get("property_detail", {}).get("STATUS", ""),
+        "county": listing.get("property_detail", {}).get("COUNTY", ""),
+        "total_sqft": listing.get("property_detail", {}).get("TOTAL SQFT", ""),
+        "lot_size_unit": listing.get("property_detail", {}).get("LOT SIZE UNI", ""),
+        "lot_size": listing.get("property_detail", {}).get("LOT SIZE", ""),
+        "full_bathrooms": listing.get("property_detail", {}).get("FULL BATHROOMS", ""),
+        "bedrooms": listing.get("property_detail", {}).get("BEDROOMS", ""),
+        "right": listing.get("description_detail", {}).get("Right", ""),
+        "address": listing.get("description_detail", {}).get("Address", ""),
+        "access": listing.get("description_detail", {}).get("Access", []),
+        "structure": listing.get("description_detail", {}).get("Structure", ""),
+        "lot_catetory": listing.get("description_detail", {}).get("Lot Category", ""),
+        "area_designation": listing.get("description_detail", {}).get("Area designation", ""),
+        "area_of_use": listing.get("description_detail", {}).get("Area of use", ""),
+        "building_ratio_and_floor_area_ratio": listing.get("description_detail", {}).get("Building ratio and floor area ratio", ""),
+        "fire_protection_designation": listing.get("description_detail", {}).get("Fire protection designation", ""),
+        "other_restrictions": listing.get("description_detail", {}).get("Other Restrictions", ""),
+        "living_area": listing.get("description_detail", {}).get("Living Area", ""),
+        "year_built": listing.get("description_detail", {}).get("Year built", ""),
+        "current_status": listing.get("description_detail", {}).get("Current Status", ""),
+        "delivery_date": listing.get("description_detail", {}).get("Delivery Date", ""),
+        "mode_of_transaction": listing.get("description_detail", {}).get("Mode of Transaction", ""),
+    }
+
+
 class Assistant(Agent):
     def __init__(self) -> None:
         super().__init__(instructions=SYSTEM_PROMPT)
@@ -50,6 +128,7 @@ class Assistant(Agent):
         }
         self.contact_info = {"email": "", "phone": ""}
         self.collecting_contact = False
+        self.search_cursor = None
 
 
     @function_tool()
@@ -64,49 +143,77 @@ class Assistant(Agent):
         return greeting
 
     @function_tool()
+    @track_tool_call
     async def search_real_estate(self, location: str, price: str, bedrooms: str, context: RunContext, top_k: int = 3):
         # Build your query vector from the input (use your embedding logic)
         query = f"{bedrooms} bedroom property in {location} priced around {price}"
-        # Use the same embedding model as during upsert
-        embedding = await asyncio.to_thread(get_embedding, query)
-        results = await asyncio.to_thread(index.query, vector=embedding, top_k=top_k, include_metadata=True)
-        matches = []
-        for match in results['matches']:
-            listing = json.loads(match['metadata']['full'])
-            matches.append({
-                "title": listing.get("title", "Untitled"),
-                "imgs": listing.get("imgs", []),
-                "videos": listing.get("videos", ""),
-                "floor_plan": listing.get("floor_plain", []),
-                "virtual_tutor": listing.get("virtual_tutor", []),
-                "property_id": listing.get("property_detail", {}).get("PROPERTY ID", ""),
-                "price": listing.get("property_detail", {}).get("PRICE", ""),
-                "property_type": listing.get("property_detail", {}).get("PROPERTY TYPE", ""),
-                "marketed_by": listing.get("property_detail", {}).get("MARKETED BY", ""),
-                "status": listing.get("property_detail", {}).get("STATUS", ""),
-                "county": listing.get("property_detail", {}).get("COUNTY", ""),
-                "total_sqft": listing.get("property_detail", {}).get("TOTAL SQFT", ""),
-                "lot_size_unit": listing.get("property_detail", {}).get("LOT SIZE UNI", ""),
-                "lot_size": listing.get("property_detail", {}).get("LOT SIZE", ""),
-                "full_bathrooms": listing.get("property_detail", {}).get("FULL BATHROOMS", ""),
-                "bedrooms": listing.get("property_detail", {}).get("BEDROOMS", ""),
-                "right": listing.get("description_detail", {}).get("Right", ""),
-                "address": listing.get("description_detail", {}).get("Address", ""),
-                "access": listing.get("description_detail", {}).get("Access", []),
-                "structure": listing.get("description_detail", {}).get("Structure", ""),
-                "lot_catetory": listing.get("description_detail", {}).get("Lot Category", ""),
-                "area_designation": listing.get("description_detail", {}).get("Area designation", ""),
-                "area_of_use": listing.get("description_detail", {}).get("Area of use", ""),
-                "building_ratio_and_floor_area_ratio": listing.get("description_detail", {}).get("Building ratio and floor area ratio", ""),
-                "fire_protection_designation": listing.get("description_detail", {}).get("Fire protection designation", ""),
-                "other_restrictions": listing.get("description_detail", {}).get("Other Restrictions", ""),
-                "living_area": listing.get("description_detail", {}).get("Living Area", ""),
-                "year_built": listing.get("description_detail", {}).get("Year built", ""),
-                "current_status": listing.get("description_detail", {}).get("Current Status", ""),
-                "delivery_date": listing.get("description_detail", {}).get("Delivery Date", ""),
-                "mode_of_transaction": listing.get("description_detail", {}).get("Mode of Transaction", ""),
-            })
+        try:
+            # Use the same embedding model as during upsert
+            embedding = await asyncio.to_thread(get_embedding, query)
+            # Fetch a deeper ranked list once so follow-ups can page and filter locally
+            results = await asyncio.to_thread(query_index, vector=embedding, top_k=max(top_k, CANDIDATE_POOL_SIZE), include_metadata=True)
+        except RateLimitExceeded as e:
+            logging.warning(f"[search_real_estate] {e}")
+            return "The property search is busy right now. Apologize and ask the user to try again in a moment."
+        candidates = [(match['score'], json.loads(match['metadata']['full'])) for match in results['matches']]
+        self.search_cursor = SearchCursor(candidates, page_size=top_k)
+        matches = [listing_to_match(listing) for listing in self.search_cursor.next_page()]
         print(matches)
+        await self._send_matches(matches)
+        return matches
+
+    @function_tool()
+    @track_tool_call
+    async def show_more_results(self, context: RunContext):
+        """Show the next results from the last search without searching again"""
+        if self.search_cursor is None:
+            return "No previous search. Ask the user for location, price and bedrooms and call search_real_estate."
+        if not self.search_cursor.has_more():
+            return "No more matching properties from the last search. Ask the user to search again with different requirements."
+        matches = [listing_to_match(listing) for listing in self.search_cursor.next_page()]
+        await self._send_matches(matches)
+        return matches
+
+    @function_tool()
+    @track_tool_call
+    async def refine_search(self, context: RunContext, min_price: str = "", max_price: str = "", bedrooms: str = ""):
+        """Filter the last search results by price range or minimum bedrooms without searching again. Leave a filter empty to keep it, or pass "any" to remove it"""
+        if self.search_cursor is None:
+            return "No previous search. Ask the user for location, price and bedrooms and call search_real_estate."
+        self.search_cursor.refine(
+            min_price=parse_filter(min_price, parse_price),
+            max_price=parse_filter(max_price, parse_price),
+            bedrooms=parse_filter(bedrooms, parse_bedrooms),
+        )
+        matches = [listing_to_match(listing) for listing in self.search_cursor.next_page()]
+        if not matches:
+            return "No properties from the last search match these requirements. Ask the user whether to drop a requirement (pass \"any\" to refine_search) or to search again."
+        await self._send_matches(matches)
+        return matches
+
+    @function_tool()
+    @track_tool_call
+    async def find_similar_properties(self, property_id: str, context: RunContext, min_price: str = "", max_price: str = "", bedrooms: str = "", top_k: int = 3):
+        """Find properties similar to a chosen one, by its property id or title, optionally cheaper or with more bedrooms"""
+        similarity_graph = get_similarity_graph()
+        if similarity_graph is None:
+            return "Similar property search is not available. Ask the user to search again."
+        candidates = similarity_graph.similar(property_id)
+        if candidates is None:
+            return f"Property {property_id} was not found. Ask the user which property they mean."
+        self.search_cursor = SearchCursor(candidates, page_size=top_k)
+        self.search_cursor.refine(
+            min_price=parse_price(min_price),
+            max_price=parse_price(max_price),
+            bedrooms=parse_bedrooms(bedrooms),
+        )
+        matches = [listing_to_match(listing) for listing in self.search_cursor.next_page()]
+        if not matches:
+            return "No similar properties match these requirements. Ask the user to search again."
+        await self._send_matches(matches)
+        return matches
+
+    async def _send_matches(self, matches: list):
         room = get_job_context().room
         dest_identity = next(iter(room.remote_participants))
         payload_str = json.dumps(matches)
@@ -117,9 +224,9 @@ class Assistant(Agent):
             payload=payload_str,
             response_timeout=10.0,
         )
-        return matches
 
     @function_tool()
+    @track_tool_call
     async def show_contact_form(self, context: RunContext):
         """Show contact form to collect user's email and phone number"""
         room = get_job_context().room
@@ -141,6 +248,7 @@ class Assistant(Agent):
         return "Contact form displayed"
 
     @function_tool()
+    @track_tool_call
     async def submit_contact_info(self, email: str, phone: str, context: RunContext):
         """Submit collected contact information"""
         room = get_job_context().room
@@ -193,6 +301,7 @@ class Assistant(Agent):
             return "Contact form incomplete"
 
     @function_tool()
+    @track_tool_call
     async def get_contact_info_from_frontend(self, context: RunContext):
         """Get contact information that was submitted through the frontend form"""
         room = get_job_context().room
@@ -329,13 +438,40 @@ class Assistant(Agent):
         self.current_language = language_code
         await self._session.say(self.greetings[language_code])
 
+    def prewarm(self, proc: agents.JobProcess):
+        # Runs once per job process before it takes a room; step timings are
+        # kept in userdata for startup_profile.py
+        def load_vad():
+            from livekit.plugins import silero
+            proc.userdata["vad"] = silero.VAD.load(activation_threshold=0.7)
+
+        timings = {}
+        for name, step in (
+            ("plugins", import_plugins),
+            ("vad", load_vad),
+            ("openai_client", get_openai_client),
+            ("index", get_index),
+            ("similarity_graph", get_similarity_graph),
+        ):
+            start = time.perf_counter()
+            step()
+            timings[name] = time.perf_counter() - start
+        proc.userdata["prewarm_timings"] = timings
+        logging.info(f"Prewarm took {sum(timings.values()):.2f}s: " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
     async def entrypoint(self, ctx: agents.JobContext):
-        
+        # Report loop lag, CPU and in-flight tool calls to the worker's load_fnc
+        job_monitor.start()
+        ctx.add_shutdown_callback(job_monitor.stop)
+
+        # Already imported by prewarm, this only binds the names
+        from livekit.plugins import deepgram, google, noise_cancellation, openai
+
         session = AgentSession(
             stt=deepgram.STT(model="nova-2", language="en"),  # Multi-language detection
             llm=openai.LLM(model="gpt-4o-mini", temperature=0.3),
             tts=google.TTS(gender="male", voice_name="en-US-Chirp-HD-F"),
-            vad=silero.VAD.load(activation_threshold=0.7),
+            vad=ctx.proc.userdata["vad"],
             # turn_detection=EnglishModel(),  # Disabled due to timeout issues
         )
 
@@ -409,7 +545,18 @@ class Assistant(Agent):
 
 
     def run(self):
-        agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=self.entrypoint))
+        # Plugins only register their model files once imported. Console mode
+        # and Windows run jobs on threads, where plugins cannot be registered.
+        if "download-files" in sys.argv or "console" in sys.argv or sys.platform.startswith("win"):
+            import_plugins()
+        init_worker_state()
+        agents.cli.run_app(agents.WorkerOptions(
+            entrypoint_fnc=self.entrypoint,
+            prewarm_fnc=self.prewarm,
+            request_fnc=admit_job,
+            load_fnc=worker_load,
+            load_threshold=WORKER_LOAD_THRESHOLD,
+        ))
 
 if __name__ == "__main__":
     Assistant().run()
\ No newline at end of file
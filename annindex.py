@@ -0,0 +1,259 @@
+import os
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+# Local approximate nearest-neighbour index for listing embeddings.
+#
+# IVF layout: vectors are clustered with spherical k-means and stored grouped
+# by cluster, so a query only scans the `n_probe` closest clusters. Each vector
+# is kept in RAM as int8 codes plus one float32 scale; the float32 originals
+# stay on disk (memory-mapped) and are only touched to re-rank the short list.
+# Listing metadata is not copied into the index: the top_k results are read
+# from the catalog export on disk by row offset.
+
+load_dotenv()
+
+CATALOG_DIR = os.getenv("CATALOG_DIR", "catalog")
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", os.path.join(CATALOG_DIR, "ann"))
+
+DIMENSION = 1536
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray):
+    # Symmetric per-vector int8 quantization: x ~= codes * scale
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        chunk = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(vectors: np.ndarray, n_lists: int, n_iter: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Train on a sample; ~64 points per list is plenty for IVF coarse quantizers
+    sample_size = min(len(vectors), n_lists * 64)
+    sample = vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        # Re-seed empty lists from random sample points
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class ListingStore:
+    """Catalog listings on disk, read one row at a time through a line offset table."""
+
+    def __init__(self, path: str, offsets: np.ndarray):
+        self.path = path
+        # offsets[i]:offsets[i + 1] is the byte range of row i
+        self.offsets = offsets
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def open(cls, catalog_dir: str = CATALOG_DIR):
+        path = os.path.join(catalog_dir, "listings.jsonl")
+        offsets_path = os.path.join(catalog_dir, "listings.offsets.npy")
+        if os.path.exists(offsets_path):
+            offsets = np.load(offsets_path)
+        else:
+            # Older exports have no offset table, scan the file once
+            offsets = [0]
+            with open(path, "rb") as f:
+                for line in f:
+                    offsets.append(offsets[-1] + len(line))
+            offsets = np.asarray(offsets, dtype=np.int64)
+        return cls(path, offsets)
+
+    def fingerprint(self) -> str:
+        # Identifies the export the rows belong to; any re-export with other rows changes it
+        return hashlib.sha1(np.asarray(self.offsets, dtype=np.int64).tobytes()).hexdigest()
+
+    def get(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        with self._lock:
+            self._file.seek(start)
+            line = self._file.read(end - start)
+        return json.loads(line)
+
+
+def save_listings(catalog_dir: str, ids, fulls):
+    # listings.jsonl plus its line offset table, so rows can be read without loading the file
+    offsets = [0]
+    with open(os.path.join(catalog_dir, "listings.jsonl"), "wb") as f:
+        for id, full in zip(ids, fulls):
+            line = (json.dumps({"id": id, "full": full}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(catalog_dir, "listings.offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+
+class ANNIndex:
+    def __init__(self, centroids, offsets, codes, scales, vectors, ids, rows, store=None, n_probe=16, rerank=64):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.codes = codes
+        self.scales = scales
+        self.vectors = vectors
+        self.ids = ids
+        # Catalog row of each index row, for reading metadata from the store
+        self.rows = rows
+        self.store = store
+        self.n_probe = n_probe
+        self.rerank = rerank
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectors, ids, n_lists=None, n_iter=10, seed=0, **kwargs):
+        vectors = normalize(vectors)
+        if n_lists is None:
+            n_lists = int(np.clip(np.sqrt(len(vectors)), 1, 4096))
+        n_lists = min(n_lists, len(vectors))
+
+        centroids = _train_centroids(vectors, n_lists, n_iter, seed)
+        assignments = _assign(vectors, centroids)
+
+        # Store rows grouped by list so each list is a contiguous slice
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+        vectors = vectors[order]
+        codes, scales = quantize(vectors)
+        ids = [ids[i] for i in order]
+        return cls(centroids, offsets, codes, scales, vectors, ids, order.astype(np.int64), **kwargs)
+
+    def save(self, path: str = ANN_INDEX_DIR, catalog: str = None):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        np.save(os.path.join(path, "scales.npy"), self.scales)
+        np.save(os.path.join(path, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+        np.save(os.path.join(path, "rows.npy"), self.rows)
+        with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.ids, f)
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"dimension": int(self.centroids.shape[1]), "n_lists": len(self.centroids),
+                       "count": len(self.ids), "n_probe": self.n_probe, "rerank": self.rerank,
+                       # ListingStore.fingerprint of the catalog the rows point into
+                       "catalog": catalog}, f)
+
+    @classmethod
+    def load(cls, path: str = ANN_INDEX_DIR, store: ListingStore = None):
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if store is not None and info.get("catalog") != store.fingerprint():
+            raise ValueError(f"ANN index at {path} was built from a different catalog export than {store.path}, rebuild it with annindex.py")
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(
+            centroids=np.load(os.path.join(path, "centroids.npy")),
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+            codes=np.load(os.path.join(path, "codes.npy")),
+            scales=np.load(os.path.join(path, "scales.npy")),
+            # Full-precision vectors are only read for re-ranking, keep them on disk
+            vectors=np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+            ids=ids,
+            rows=np.load(os.path.join(path, "rows.npy")),
+            store=store,
+            n_probe=info.get("n_probe", 16),
+            rerank=info.get("rerank", 64),
+        )
+
+    def search(self, vector, top_k=3, n_probe=None, rerank=None):
+        """Return (row, score) pairs for the top_k most similar stored vectors."""
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        rerank = max(rerank or self.rerank, top_k)
+        query = normalize(vector)
+
+        probes = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        rows, approx = [], []
+        for lst in probes:
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            if start == end:
+                continue
+            approx.append((self.codes[start:end].astype(np.float32) @ query) * self.scales[start:end])
+            rows.append(np.arange(start, end))
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        approx = np.concatenate(approx)
+
+        # Short list from the quantized scores, exact re-rank on float32
+        if len(rows) > rerank:
+            shortlist = np.argpartition(-approx, rerank - 1)[:rerank]
+            rows = np.sort(rows[shortlist])
+        exact = np.asarray(self.vectors[rows]) @ query
+        best = np.argsort(-exact)[:top_k]
+        return [(int(rows[i]), float(exact[i])) for i in best]
+
+    def query(self, vector, top_k=3, include_metadata=False, **kwargs):
+        """Pinecone-compatible query so callers can swap the local index in."""
+        matches = []
+        for row, score in self.search(vector, top_k=top_k, **kwargs):
+            match = {"id": self.ids[row], "score": score}
+            if include_metadata and self.store is not None:
+                match["metadata"] = {"full": self.store.get(int(self.rows[row]))["full"]}
+            matches.append(match)
+        return {"matches": matches}
+
+
+def load_catalog(catalog_dir: str = CATALOG_DIR):
+    # Catalog export written by vectordb.upsert_data
+    vectors = np.load(os.path.join(catalog_dir, "embeddings.npy"))
+    ids = []
+    with open(os.path.join(catalog_dir, "listings.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            ids.append(json.loads(line)["id"])
+    return vectors, ids
+
+
+def load_index(path: str = ANN_INDEX_DIR, catalog_dir: str = CATALOG_DIR):
+    if not os.path.exists(os.path.join(path, "index.json")):
+        return None
+    return ANNIndex.load(path, store=ListingStore.open(catalog_dir))
+
+
+def build_index(catalog_dir: str = CATALOG_DIR, out_dir: str = ANN_INDEX_DIR, n_lists=None):
+    vectors, ids = load_catalog(catalog_dir)
+    ann = ANNIndex.build(vectors, ids, n_lists=n_lists)
+    ann.save(out_dir, catalog=ListingStore.open(catalog_dir).fingerprint())
+    print(f"✅ Built ANN index with {len(ann)} vectors in {len(ann.centroids)} lists at {out_dir}")
+    return ann
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local ANN index from the catalog export")
+    parser.add_argument("--catalog", default=CATALOG_DIR)
+    parser.add_argument("--out", default=ANN_INDEX_DIR)
+    parser.add_argument("--lists", type=int, default=None)
+    args = parser.parse_args()
+    build_index(args.catalog, args.out, args.lists)
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from annindex import ANNIndex, CATALOG_DIR, DIMENSION, ListingStore, load_catalog, normalize
+
+# Benchmark the local ANN index against exact brute-force search.
+# Reports recall@k, query latency and memory per million vectors.
+
+
+def synthetic_vectors(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    # Clustered data behaves much closer to real embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((n_clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, n_clusters, size=n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * (0.6 / np.sqrt(dim))
+    return normalize(centers[labels] + noise)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def run(vectors: np.ndarray, n_queries: int, k: int, n_lists, n_probe: int, rerank: int, store: ListingStore = None, seed: int = 0):
+    rng = np.random.default_rng(seed + 1)
+    vectors = normalize(vectors)
+    ids = [f"listing-{i}" for i in range(len(vectors))]
+
+    start = time.perf_counter()
+    ann = ANNIndex.build(vectors, ids, n_lists=n_lists, n_probe=n_probe, rerank=rerank)
+    build_s = time.perf_counter() - start
+
+    # Queries are perturbed catalog vectors, like a user query near real listings
+    picks = rng.choice(len(vectors), size=n_queries, replace=len(vectors) < n_queries)
+    queries = normalize(vectors[picks] + rng.standard_normal((n_queries, vectors.shape[1])).astype(np.float32) * 0.02)
+
+    exact_times, ann_times, hits = [], [], 0
+    for query in queries:
+        t0 = time.perf_counter()
+        scores = vectors @ query
+        truth = np.argpartition(-scores, k - 1)[:k]
+        exact_times.append(time.perf_counter() - t0)
+        truth_ids = {ids[i] for i in truth}
+
+        t0 = time.perf_counter()
+        found = ann.search(query, top_k=k)
+        ann_times.append(time.perf_counter() - t0)
+        hits += len(truth_ids & {ann.ids[row] for row, _ in found})
+
+    n = len(vectors)
+    resident = ann.codes.nbytes + ann.scales.nbytes + ann.centroids.nbytes + ann.offsets.nbytes + ann.rows.nbytes
+    resident += sys.getsizeof(ann.ids) + sum(sys.getsizeof(id) for id in ann.ids)
+    on_disk = np.asarray(ann.vectors).nbytes
+    # Listing metadata stays on disk; only its line offset table is resident
+    resident += store.offsets.nbytes if store is not None else 8 * (n + 1)
+    listings_on_disk = os.path.getsize(store.path) if store is not None else None
+    per_million = 1_000_000 / n
+
+    print(f"vectors={n} dim={vectors.shape[1]} lists={len(ann.centroids)} n_probe={n_probe} rerank={rerank}")
+    print(f"build time: {build_s:.2f}s")
+    print(f"recall@{k}: {hits / (n_queries * k):.4f}")
+    print(f"brute force latency: p50={percentile_ms(exact_times, 50):.2f}ms p95={percentile_ms(exact_times, 95):.2f}ms")
+    print(f"ANN latency:         p50={percentile_ms(ann_times, 50):.2f}ms p95={percentile_ms(ann_times, 95):.2f}ms")
+    print(f"memory per 1M vectors: resident={resident * per_million / 2**20:.0f}MiB "
+          f"(float32 brute force={vectors.nbytes * per_million / 2**20:.0f}MiB), "
+          f"re-rank store on disk={on_disk * per_million / 2**20:.0f}MiB")
+    if listings_on_disk is not None:
+        print(f"listing store on disk per 1M listings: {listings_on_disk * per_million / 2**20:.0f}MiB")
+    else:
+        print("listing store on disk: not measured for synthetic data, use --catalog")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall and latency against brute force")
+    parser.add_argument("--catalog", default=None, help=f"use a catalog export (e.g. {CATALOG_DIR}) instead of synthetic data")
+    parser.add_argument("--n", type=int, default=100_000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=DIMENSION)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, default=16)
+    parser.add_argument("--rerank", type=int, default=64)
+    args = parser.parse_args()
+
+    store = None
+    if args.catalog:
+        vectors, _ = load_catalog(args.catalog)
+        store = ListingStore.open(args.catalog)
+    else:
+        vectors = synthetic_vectors(args.n, args.dim)
+    run(vectors, args.queries, args.k, args.lists, args.n_probe, args.rerank, store)
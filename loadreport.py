@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+import functools
+import psutil
+from dotenv import load_dotenv
+from ratelimit import log_stats as log_rate_limit_stats
+
+# Worker load reporting built on measured signals.
+#
+# Each job process runs a JobMonitor that measures its event-loop lag, its CPU
+# use (VAD and noise cancellation run in-process) and its in-flight tool calls,
+# and writes them to a small file under LOAD_STATE_DIR. The worker's load_fnc
+# combines those files with the number of active rooms into one load value.
+# Each signal is scaled so that reaching its configured limit equals
+# WORKER_LOAD_THRESHOLD, the point where the worker stops taking rooms. With
+# WORKER_MAX_ROOMS=8 the worker is full at exactly 8 rooms.
+
+load_dotenv()
+
+WORKER_MAX_ROOMS = int(os.getenv("WORKER_MAX_ROOMS", "8"))
+WORKER_MAX_LOOP_LAG_MS = float(os.getenv("WORKER_MAX_LOOP_LAG_MS", "100"))
+# Fraction of the worker's cores (affinity and cgroup quota) the job processes may use together
+WORKER_CPU_BUDGET = float(os.getenv("WORKER_CPU_BUDGET", "0.8"))
+WORKER_MAX_TOOL_CALLS = int(os.getenv("WORKER_MAX_TOOL_CALLS", "16"))
+# Stop accepting rooms at this load, before turn latency degrades
+WORKER_LOAD_THRESHOLD = float(os.getenv("WORKER_LOAD_THRESHOLD", "0.75"))
+
+REPORT_INTERVAL = 1.0
+PROBE_INTERVAL = 0.1
+# Loop lag is smoothed over probes (time constant ~1s), so a single GC pause
+# or model init does not make admission flap
+LOOP_LAG_ALPHA = 0.1
+# Reports older than this come from a job process that has exited, or whose
+# loop is blocked
+STALE_AFTER = 5 * REPORT_INTERVAL
+# How often a job process logs its rate limiter queue waits
+RATE_STATS_INTERVAL = float(os.getenv("RATE_STATS_INTERVAL", "60"))
+
+
+def init_worker_state():
+    """Pick a per-worker state directory; job processes inherit it through the environment."""
+    os.environ.setdefault("LOAD_STATE_DIR", os.path.join(tempfile.gettempdir(), f"dwilar-load-{os.getpid()}"))
+    os.makedirs(os.environ["LOAD_STATE_DIR"], exist_ok=True)
+
+
+class JobMonitor:
+    def __init__(self):
+        self.tool_calls = 0
+        self._task = None
+        self._path = None
+
+    def start(self):
+        state_dir = os.getenv("LOAD_STATE_DIR")
+        if self._task is not None or not state_dir:
+            return
+        self._path = os.path.join(state_dir, f"{os.getpid()}.json")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            log_rate_limit_stats()
+        if self._path and os.path.exists(self._path):
+            os.remove(self._path)
+
+    async def _run(self):
+        window_start = time.perf_counter()
+        cpu_start = time.process_time()
+        stats_logged = window_start
+        loop_lag = 0.0
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            now = time.perf_counter()
+            lag = max(0.0, now - before - PROBE_INTERVAL)
+            loop_lag += LOOP_LAG_ALPHA * (lag - loop_lag)
+            if now - window_start < REPORT_INTERVAL:
+                continue
+            cpu = time.process_time()
+            self._write({
+                "loop_lag_ms": loop_lag * 1000,
+                # Cores in use by this process, summed over its threads
+                "cpu": (cpu - cpu_start) / (now - window_start),
+                "tool_calls": self.tool_calls,
+                "updated": time.time(),
+            })
+            window_start, cpu_start = now, cpu
+            if now - stats_logged >= RATE_STATS_INTERVAL:
+                log_rate_limit_stats()
+                stats_logged = now
+
+    def _write(self, state: dict):
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path)
+
+
+job_monitor = JobMonitor()
+
+
+def track_tool_call(fn):
+    """Count a tool as in flight while it runs, for load reporting."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        job_monitor.tool_calls += 1
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            job_monitor.tool_calls -= 1
+    return wrapper
+
+
+def read_job_states() -> list:
+    state_dir = os.getenv("LOAD_STATE_DIR")
+    if not state_dir or not os.path.isdir(state_dir):
+        return []
+    states = []
+    now = time.time()
+    for name in os.listdir(state_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(state_dir, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - state.get("updated", 0) > STALE_AFTER:
+            if not psutil.pid_exists(int(name[:-len(".json")])):
+                os.remove(path)
+                continue
+            # The process is alive but stopped reporting: its loop is blocked
+            state["stale"] = True
+        states.append(state)
+    return states
+
+
+def _cgroup_cpu_quota():
+    # cgroup v2, then v1; None when the container has no CPU limit
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def available_cpus() -> float:
+    """Cores this worker may use: its CPU affinity, capped by any cgroup CPU quota."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = float(len(os.sched_getaffinity(0)))
+    else:
+        cpus = float(os.cpu_count() or 1)
+    quota = _cgroup_cpu_quota()
+    return min(cpus, quota) if quota else cpus
+
+
+_worker = None
+
+
+def worker_load(worker=None) -> float:
+    """load_fnc for WorkerOptions: the most saturated signal, from 0.0 to 1.0."""
+    global _worker
+    if worker is not None:
+        _worker = worker
+    active_rooms = len(_worker.active_jobs) if _worker is not None else 0
+    states = read_job_states()
+    stale = sum(1 for s in states if s.get("stale"))
+    loop_lag_ms = max((s["loop_lag_ms"] for s in states), default=0.0)
+    if stale:
+        loop_lag_ms = max(loop_lag_ms, WORKER_MAX_LOOP_LAG_MS)
+    cpu = sum(s["cpu"] for s in states)
+    tool_calls = sum(s["tool_calls"] for s in states)
+
+    # Fraction of each configured limit in use; 1.0 means the limit is reached
+    usage = {
+        "rooms": active_rooms / WORKER_MAX_ROOMS,
+        "loop_lag": loop_lag_ms / WORKER_MAX_LOOP_LAG_MS,
+        "cpu": cpu / (available_cpus() * WORKER_CPU_BUDGET),
+        "tool_calls": tool_calls / WORKER_MAX_TOOL_CALLS,
+    }
+    load = min(1.0, max(usage.values()) * WORKER_LOAD_THRESHOLD)
+    logging.debug(f"[loadreport] load={load:.2f} rooms={active_rooms} loop_lag={loop_lag_ms:.0f}ms cpu={cpu:.2f} tool_calls={tool_calls} stale={stale}")
+    return load
+
+
+async def admit_job(req):
+    """request_fnc for WorkerOptions: turn rooms away once the worker is at its threshold."""
+    # worker_load reads the job state files, keep that off the worker's event loop
+    load = await asyncio.get_running_loop().run_in_executor(None, worker_load)
+    if load >= WORKER_LOAD_THRESHOLD:
+        logging.info(f"[loadreport] Rejecting job {req.id}: load {load:.2f} >= {WORKER_LOAD_THRESHOLD:.2f}")
+        await req.reject()
+        return
+    await req.accept()
@@ -0,0 +1,201 @@
+import os
+import time
+import heapq
+import struct
+import logging
+import tempfile
+import itertools
+import threading
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a process-wide bucket
+    fcntl = None
+
+# Shared token-bucket rate limiter for OpenAI and Pinecone calls.
+#
+# The bucket state lives in a small file under RATE_LIMIT_STATE_DIR guarded by
+# flock, so the live agent workers and the vectordb.py batch job draw from the
+# same budget on a host. Batch callers may not dip into the last
+# `batch_reserve` fraction of the bucket, which keeps headroom for live voice
+# turns. Inside a process, waiters queue by priority in a bounded queue and
+# are rejected up front when they could not be served before their deadline.
+
+load_dotenv()
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+RATE_LIMIT_STATE_DIR = os.getenv("RATE_LIMIT_STATE_DIR", os.path.join(tempfile.gettempdir(), "dwilar-ratelimit"))
+
+_STATE = struct.Struct("dd")  # tokens, last refill (unix time)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, capacity: float, state_dir: str = RATE_LIMIT_STATE_DIR):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.state_dir = state_dir
+        self._fd = None
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = time.time()
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(self.state_dir, exist_ok=True)
+            self._fd = os.open(os.path.join(self.state_dir, f"{self.name}.bucket"), os.O_RDWR | os.O_CREAT, 0o666)
+        return self._fd
+
+    def _update(self, fn):
+        # Run fn(tokens) -> (tokens, result) on the refilled state, atomically across processes
+        with self._lock:
+            if fcntl is None:
+                now = time.time()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens, result = fn(self._tokens)
+                return result
+            fd = self._open()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, _STATE.size, 0)
+                now = time.time()
+                if len(data) == _STATE.size:
+                    tokens, updated = _STATE.unpack(data)
+                    tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                else:
+                    tokens = self.capacity
+                tokens, result = fn(tokens)
+                os.pwrite(fd, _STATE.pack(tokens, now), 0)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def available(self) -> float:
+        return self._update(lambda tokens: (tokens, tokens))
+
+    def try_take(self, amount: float, reserve: float = 0.0) -> float:
+        """Take tokens if the level stays above reserve. Returns 0 on success, else seconds to wait."""
+        def take(tokens):
+            if tokens - amount >= reserve:
+                return tokens - amount, 0.0
+            return tokens, (amount + reserve - tokens) / self.rate
+        return self._update(take)
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float, burst: float, max_queue: int = 32, batch_reserve: float = 0.2):
+        self.name = name
+        self.bucket = TokenBucket(name, rate, burst)
+        self.max_queue = max_queue
+        self.batch_reserve = batch_reserve * burst
+        # A batch call needs one token on top of the reserve, or it could never be served
+        if 1.0 + self.batch_reserve > burst:
+            raise ValueError(f"{name}: burst {burst} cannot hold one token plus the batch reserve {self.batch_reserve:.2f}")
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._stats = {p: {"count": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0} for p in PRIORITY_NAMES}
+
+    def _reserve(self, priority: int) -> float:
+        return self.batch_reserve if priority == BATCH else 0.0
+
+    def _estimate_wait(self, tokens: float, priority: int) -> float:
+        # Everything queued ahead of us has to be paid for first
+        ahead = sum(t for p, _, t in self._waiters if p <= priority)
+        deficit = ahead + tokens + self._reserve(priority) - self.bucket.available()
+        return max(0.0, deficit / self.bucket.rate)
+
+    def acquire(self, priority: int = INTERACTIVE, tokens: float = 1.0, deadline: float = None) -> float:
+        """Block until tokens are granted and return the queue wait in seconds.
+
+        deadline is the longest the caller is willing to wait; RateLimitExceeded
+        is raised immediately if the queue is full or the wait would exceed it.
+        """
+        if tokens + self._reserve(priority) > self.bucket.capacity:
+            raise ValueError(f"{self.name}: {tokens} tokens plus reserve {self._reserve(priority):.2f} exceed burst {self.bucket.capacity}")
+        start = time.monotonic()
+        stats = self._stats[priority]
+        with self._cond:
+            if len(self._waiters) >= self.max_queue:
+                stats["rejected"] += 1
+                raise RateLimitExceeded(f"{self.name}: {PRIORITY_NAMES[priority]} queue is full")
+            if deadline is not None and self._estimate_wait(tokens, priority) > deadline:
+                stats["rejected"] += 1
+                raise RateLimitExceeded(f"{self.name}: {PRIORITY_NAMES[priority]} request cannot be served within {deadline:.2f}s")
+            waiter = (priority, next(self._seq), tokens)
+            heapq.heappush(self._waiters, waiter)
+            try:
+                while True:
+                    if self._waiters[0] is waiter:
+                        wait = self.bucket.try_take(tokens, self._reserve(priority))
+                        if wait == 0.0:
+                            break
+                    else:
+                        wait = 0.05
+                    if deadline is not None:
+                        remaining = deadline - (time.monotonic() - start)
+                        if remaining <= 0:
+                            stats["rejected"] += 1
+                            raise RateLimitExceeded(f"{self.name}: {PRIORITY_NAMES[priority]} request timed out after {deadline:.2f}s")
+                        wait = min(wait, remaining)
+                    # Other processes share the bucket and never notify us, so poll as well
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            stats["count"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+        if waited > 1.0:
+            logging.warning(f"[ratelimit] {self.name} {PRIORITY_NAMES[priority]} call waited {waited:.2f}s in queue")
+        else:
+            logging.debug(f"[ratelimit] {self.name} {PRIORITY_NAMES[priority]} call waited {waited:.3f}s in queue")
+        return waited
+
+    def stats(self) -> dict:
+        report = {}
+        with self._cond:
+            items = [(priority, dict(s)) for priority, s in self._stats.items()]
+        for priority, s in items:
+            report[PRIORITY_NAMES[priority]] = {
+                "count": s["count"],
+                "rejected": s["rejected"],
+                "wait_mean": s["wait_total"] / s["count"] if s["count"] else 0.0,
+                "wait_max": s["wait_max"],
+            }
+        return report
+
+
+openai_limiter = RateLimiter(
+    "openai",
+    rate=float(os.getenv("OPENAI_RATE_LIMIT", "50")),
+    burst=float(os.getenv("OPENAI_RATE_BURST", "50")),
+)
+pinecone_limiter = RateLimiter(
+    "pinecone",
+    rate=float(os.getenv("PINECONE_RATE_LIMIT", "20")),
+    burst=float(os.getenv("PINECONE_RATE_BURST", "20")),
+)
+
+# Live voice turns give up quickly rather than stall the conversation
+INTERACTIVE_DEADLINE = float(os.getenv("INTERACTIVE_RATE_DEADLINE", "2.0"))
+
+
+def log_stats():
+    """Log queue waits and rejections of live calls, for the job process."""
+    for limiter in (openai_limiter, pinecone_limiter):
+        s = limiter.stats()["interactive"]
+        logging.info(f"[ratelimit] {limiter.name} interactive: count={s['count']} rejected={s['rejected']} wait_mean={s['wait_mean'] * 1000:.0f}ms wait_max={s['wait_max'] * 1000:.0f}ms")
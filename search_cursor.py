@@ -0,0 +1,89 @@
+import re
+
+# Per-session ranked result cursor.
+#
+# The first search fetches a deeper candidate list once; "show me more" pages
+# through it and slot refinements (lower price, more bedrooms) re-filter the
+# cached candidates locally, with no embedding or vector-store calls.
+
+CANDIDATE_POOL_SIZE = 30
+
+# Filter value that clears a filter set by an earlier refinement
+ANY = "any"
+
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "million": 1_000_000, "b": 1_000_000_000, "billion": 1_000_000_000}
+
+
+def parse_price(text):
+    """Parse listing or spoken prices like "$2,275,865", "1.5 million" or "800k" to a number."""
+    if text is None:
+        return None
+    match = re.search(r"(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|m|million|b|billion)?\b", str(text).lower())
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    if match.group(2):
+        value *= _MULTIPLIERS[match.group(2)]
+    return value
+
+
+def parse_bedrooms(text):
+    if text is None:
+        return None
+    match = re.search(r"\d+", str(text))
+    return int(match.group()) if match else None
+
+
+def parse_filter(text, parse):
+    """Parse a refinement filter: "" leaves the filter unchanged, "any" clears it."""
+    if str(text).strip().lower() == ANY:
+        return ANY
+    return parse(text)
+
+
+class SearchCursor:
+    def __init__(self, candidates, page_size=3):
+        # candidates: ranked list of (score, listing) from the vector search
+        self.candidates = candidates
+        self.page_size = page_size
+        self.filters = {}
+        self.results = list(candidates)
+        self.position = 0
+
+    def next_page(self, page_size=None):
+        page_size = page_size or self.page_size
+        page = self.results[self.position:self.position + page_size]
+        self.position += len(page)
+        return [listing for _, listing in page]
+
+    def has_more(self):
+        return self.position < len(self.results)
+
+    def refine(self, min_price=None, max_price=None, bedrooms=None):
+        """Re-filter the cached candidates, keeping rank order, and restart paging.
+
+        None leaves a filter unchanged and ANY clears it. Price bounds are
+        exclusive, so the price of a chosen property can be passed as the bound
+        for "cheaper" or "pricier"; bedrooms is a minimum.
+        """
+        for key, value in (("min_price", min_price), ("max_price", max_price), ("bedrooms", bedrooms)):
+            if value == ANY:
+                self.filters.pop(key, None)
+            elif value is not None:
+                self.filters[key] = value
+        self.results = [c for c in self.candidates if self._matches(c[1])]
+        self.position = 0
+        return self.results
+
+    def _matches(self, listing):
+        detail = listing.get("property_detail", {})
+        price = parse_price(detail.get("PRICE"))
+        if "min_price" in self.filters and (price is None or price <= self.filters["min_price"]):
+            return False
+        if "max_price" in self.filters and (price is None or price >= self.filters["max_price"]):
+            return False
+        if "bedrooms" in self.filters:
+            bedrooms = parse_bedrooms(detail.get("BEDROOMS"))
+            if bedrooms is None or bedrooms < self.filters["bedrooms"]:
+                return False
+        return True
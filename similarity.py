@@ -0,0 +1,136 @@
+import os
+import json
+import argparse
+import numpy as np
+from annindex import ANNIndex, CATALOG_DIR, ListingStore, load_catalog, normalize
+
+# Precomputed listing-to-listing k-nearest-neighbour graph for "more like this".
+#
+# Built at ingestion from the stored embeddings and saved next to the catalog,
+# so the agent answers "similar to property X" with a lookup plus local
+# filtering, without an embedding call or a vector-store query. Listings are
+# read from the catalog export on disk only when they are looked up.
+
+NEIGHBORS = 30
+# Above this size exact all-pairs search gets too slow, use the ANN index instead
+EXACT_LIMIT = 50_000
+
+GRAPH_FILES = ("neighbors.npy", "neighbor_scores.npy", "similarity_keys.json")
+
+
+def _exact_neighbors(vectors: np.ndarray, k: int, batch_size: int = 1024):
+    neighbors = np.empty((len(vectors), k), dtype=np.int32)
+    scores = np.empty((len(vectors), k), dtype=np.float16)
+    for start in range(0, len(vectors), batch_size):
+        sims = vectors[start:start + batch_size] @ vectors.T
+        rows = np.arange(len(sims))
+        sims[rows, start + rows] = -np.inf  # a listing is not its own neighbour
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        neighbors[start:start + batch_size] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + batch_size] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+def _ann_neighbors(vectors: np.ndarray, k: int):
+    ann = ANNIndex.build(vectors, list(range(len(vectors))))
+    neighbors = np.full((len(vectors), k), -1, dtype=np.int32)
+    scores = np.zeros((len(vectors), k), dtype=np.float16)
+    for i, vector in enumerate(vectors):
+        found = [(ann.ids[row], score) for row, score in ann.search(vector, top_k=k + 1) if ann.ids[row] != i][:k]
+        neighbors[i, :len(found)] = [row for row, _ in found]
+        scores[i, :len(found)] = [score for _, score in found]
+    return neighbors, scores
+
+
+def _lookup_keys(store: ListingStore) -> dict:
+    # Property ids, plus titles that name exactly one property
+    keys, titles = {}, {}
+    for row in range(len(store)):
+        listing = json.loads(store.get(row)["full"])
+        property_id = listing.get("property_detail", {}).get("PROPERTY ID", "")
+        if property_id:
+            keys.setdefault(property_id.lower(), row)
+        title = listing.get("title", "").strip().lower()
+        if title:
+            titles.setdefault(title, {})[property_id or row] = row
+    for title, rows in titles.items():
+        if len(rows) == 1 and title not in keys:
+            keys[title] = next(iter(rows.values()))
+    return keys
+
+
+def build_similarity_graph(catalog_dir: str = CATALOG_DIR, k: int = NEIGHBORS):
+    vectors, ids = load_catalog(catalog_dir)
+    vectors = normalize(vectors)
+    k = min(k, len(vectors) - 1)
+    if k <= 0:
+        # Never leave a graph behind that no longer matches the catalog
+        for name in GRAPH_FILES:
+            path = os.path.join(catalog_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Not enough listings in {catalog_dir} for a similarity graph")
+        return
+    if len(vectors) <= EXACT_LIMIT:
+        neighbors, scores = _exact_neighbors(vectors, k)
+    else:
+        neighbors, scores = _ann_neighbors(vectors, k)
+    np.save(os.path.join(catalog_dir, "neighbors.npy"), neighbors)
+    np.save(os.path.join(catalog_dir, "neighbor_scores.npy"), scores)
+    with open(os.path.join(catalog_dir, "similarity_keys.json"), "w", encoding="utf-8") as f:
+        json.dump(_lookup_keys(ListingStore.open(catalog_dir)), f, ensure_ascii=False)
+    print(f"✅ Saved {k}-nearest-neighbour graph for {len(ids)} listings to {catalog_dir}")
+
+
+class SimilarityGraph:
+    def __init__(self, store, neighbors, scores, rows):
+        # neighbors/scores rows are aligned with the catalog rows in store
+        self.store = store
+        self.neighbors = neighbors
+        self.scores = scores
+        # Lower-cased property id or unique title -> catalog row
+        self.rows = rows
+
+    @classmethod
+    def load(cls, catalog_dir: str = CATALOG_DIR):
+        if not all(os.path.exists(os.path.join(catalog_dir, name)) for name in GRAPH_FILES):
+            return None
+        with open(os.path.join(catalog_dir, "similarity_keys.json"), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        return cls(
+            store=ListingStore.open(catalog_dir),
+            # Memory-mapped so job processes share the pages
+            neighbors=np.load(os.path.join(catalog_dir, "neighbors.npy"), mmap_mode="r"),
+            scores=np.load(os.path.join(catalog_dir, "neighbor_scores.npy"), mmap_mode="r"),
+            rows=rows,
+        )
+
+    def _listing(self, row: int) -> dict:
+        return json.loads(self.store.get(int(row))["full"])
+
+    def similar(self, key: str):
+        """Return the ranked (score, listing) neighbours of a listing, or None if unknown."""
+        row = self.rows.get(str(key).strip().lower())
+        if row is None:
+            return None
+        property_id = self._listing(row).get("property_detail", {}).get("PROPERTY ID", "")
+        results = []
+        for n, score in zip(self.neighbors[row], self.scores[row]):
+            if n < 0:
+                continue
+            listing = self._listing(n)
+            # Duplicate catalog entries of the same property are not "similar" results
+            if property_id and listing.get("property_detail", {}).get("PROPERTY ID", "") == property_id:
+                continue
+            results.append((float(score), listing))
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the listing similarity graph from the catalog export")
+    parser.add_argument("--catalog", default=CATALOG_DIR)
+    parser.add_argument("--k", type=int, default=NEIGHBORS)
+    args = parser.parse_args()
+    build_similarity_graph(args.catalog, args.k)
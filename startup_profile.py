@@ -0,0 +1,102 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# Cold-start regression check. Imports a module in a fresh interpreter with
+# `-X importtime` and prints the slowest imports. Then runs Assistant.prewarm
+# in another fresh interpreter, because prewarm is the job-process cold start,
+# and prints each prewarm step. Fails if either total is over its budget.
+
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+STARTUP_PREWARM_BUDGET_MS = float(os.getenv("STARTUP_PREWARM_BUDGET_MS", "5000"))
+
+_PREWARM_SCRIPT = """
+import json, types
+import agent
+proc = types.SimpleNamespace(userdata={})
+agent.Assistant().prewarm(proc)
+print(json.dumps(proc.userdata["prewarm_timings"]))
+"""
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str = "agent"):
+    """Return (module, self_us, cumulative_us, depth) for every import made by `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return timings
+
+
+def profile_prewarm():
+    """Return {step: seconds} from running Assistant.prewarm in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", _PREWARM_SCRIPT],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"prewarm failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report_prewarm(timings: dict):
+    total_ms = sum(timings.values()) * 1000
+    print(f"Total prewarm time: {total_ms:.0f}ms")
+    for step, seconds in sorted(timings.items(), key=lambda t: -t[1]):
+        print(f"{seconds * 1000:>10.1f}ms  {step}")
+    return total_ms
+
+
+def report(timings, top: int = 25):
+    # The target module is imported last and its cumulative time is the total
+    total_ms = timings[-1][2] / 1000 if timings else 0.0
+    print(f"Total import time: {total_ms:.0f}ms")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us, depth in sorted(timings, key=lambda t: -t[2])[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {'  ' * depth}{name}")
+    return total_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile module import times for agent cold start")
+    parser.add_argument("--module", default="agent")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    parser.add_argument("--prewarm-budget-ms", type=float, default=STARTUP_PREWARM_BUDGET_MS)
+    parser.add_argument("--skip-prewarm", action="store_true", help="only time the import")
+    args = parser.parse_args()
+
+    failed = False
+    total_ms = report(profile_imports(args.module), args.top)
+    if total_ms > args.budget_ms:
+        print(f"❌ Import time {total_ms:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+        failed = True
+    else:
+        print(f"✅ Import time is within the {args.budget_ms:.0f}ms budget")
+
+    if not args.skip_prewarm:
+        print()
+        prewarm_ms = report_prewarm(profile_prewarm())
+        if prewarm_ms > args.prewarm_budget_ms:
+            print(f"❌ Prewarm time {prewarm_ms:.0f}ms is over the {args.prewarm_budget_ms:.0f}ms budget")
+            failed = True
+        else:
+            print(f"✅ Prewarm time is within the {args.prewarm_budget_ms:.0f}ms budget")
+    sys.exit(1 if failed else 0)
@@ -1,9 +1,13 @@
 import os
 import json
+import numpy as np
 from pinecone import Pinecone, ServerlessSpec
 from openai import OpenAI
 from dotenv import load_dotenv
 from tqdm import tqdm
+from annindex import ANN_INDEX_DIR, DIMENSION, build_index, save_listings
+from similarity import build_similarity_graph
+from ratelimit import BATCH, openai_limiter, pinecone_limiter
 
 load_dotenv()
 
@@ -12,6 +16,7 @@ OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+CATALOG_DIR = os.getenv("CATALOG_DIR", "catalog")
 
 # Create OpenAI client
 openai_client = OpenAI(api_key=OPENAI_KEY)
@@ -23,7 +28,7 @@ pc = Pinecone(api_key=PINECONE_API_KEY)
 if PINECONE_INDEX_NAME not in pc.list_indexes().names():
     pc.create_index(
         name=PINECONE_INDEX_NAME,
-        dimension=1536,
+        dimension=DIMENSION,
         metric="cosine",
         spec=ServerlessSpec(
             cloud="aws",  # or your cloud provider
@@ -37,12 +42,21 @@ index = pc.Index(PINECONE_INDEX_NAME)
 # Use the new OpenAI client
 
 def get_embedding(text: str) -> list:
+    # Batch priority: live agent turns on this host go first
+    openai_limiter.acquire(BATCH)
     res = openai_client.embeddings.create(
         input=[text],
         model="text-embedding-3-small"
     )
     return res.data[0].embedding
 
+# Save embeddings and listings locally so annindex.py can build without re-embedding
+def save_catalog(ids, embeddings, fulls, catalog_dir=CATALOG_DIR):
+    os.makedirs(catalog_dir, exist_ok=True)
+    np.save(os.path.join(catalog_dir, "embeddings.npy"), np.asarray(embeddings, dtype=np.float32))
+    save_listings(catalog_dir, ids, fulls)
+    print(f"✅ Saved {len(ids)} listings to {catalog_dir}")
+
 # print(pc.list_indexes().to_dict())
 # print("Embedding dimension:", len(get_embedding("test")))
 # Prepare your data from JSON and upsert to Pinecone
@@ -51,6 +65,8 @@ def upsert_data(json_file="data.json"):
         listings = json.load(f)
 
     vectors = []
+    catalog_ids, catalog_fulls = [], []
+    catalog_embeddings = np.zeros((len(listings), DIMENSION), dtype=np.float32)
     for i, listing in enumerate(tqdm(listings)):        
         id = f"listing-{i}"
         try:
@@ -66,18 +82,30 @@ def upsert_data(json_file="data.json"):
 
             embedding = get_embedding(summary)
 
-            vectors.append((id, embedding, {"full": json.dumps(listing, ensure_ascii=False)}))
+            full = json.dumps(listing, ensure_ascii=False)
+            vectors.append((id, embedding, {"full": full}))
+            catalog_embeddings[len(catalog_ids)] = embedding
+            catalog_ids.append(id)
+            catalog_fulls.append(full)
 
             # chunk upload every 100
             if len(vectors) >= 100:
+                pinecone_limiter.acquire(BATCH)
                 index.upsert(vectors=vectors)
                 vectors.clear()
         except Exception as e:
             print(f"Error processing listing {i}: {e}")
 
     if vectors:
+        pinecone_limiter.acquire(BATCH)
         index.upsert(vectors=vectors)
     print("✅ Upload to Pinecone completed.")
+    print(f"Rate limiter queue waits: openai={openai_limiter.stats()['batch']} pinecone={pinecone_limiter.stats()['batch']}")
+    save_catalog(catalog_ids, catalog_embeddings[:len(catalog_ids)], catalog_fulls)
+    build_similarity_graph(CATALOG_DIR)
+    # An existing ANN index points at the old catalog rows, rebuild it too
+    if os.path.isdir(ANN_INDEX_DIR):
+        build_index(CATALOG_DIR, ANN_INDEX_DIR)
 
 # Run the upload
 if __name__ == "__main__":